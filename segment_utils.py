@@ -0,0 +1,83 @@
+"""
+Shared helpers for matching transcribed segments to speakers and labelling them.
+"""
+
+import numpy as np
+from numba import njit
+
+def format_timestamp(seconds):
+    """Format whole seconds as H:MM:SS, like str(timedelta) for anything under a day"""
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def format_timestamps(starts, ends):
+    """Build "start --> end" labels for arrays of segment times in seconds"""
+    return [
+        f"{format_timestamp(start)} --> {format_timestamp(end)}"
+        for start, end in zip(starts.astype(np.int64).tolist(), ends.astype(np.int64).tolist())
+    ]
+
+# Up to this many speaker segments the compiled loop beats NumPy's temporaries
+MAX_LOOP_SPEAKERS = 256
+# Above this many (segment, speaker) pairs, skip the dense overlap matrix
+MAX_DENSE_OVERLAP_CELLS = 1 << 22
+
+def match_speakers(seg_starts, seg_ends, spk_starts, spk_ends):
+    """
+    Find the speaker segment overlapping each transcribed segment the most.
+    Returns the best speaker index per segment and whether it overlaps at all.
+    """
+    if len(spk_starts) == 0:
+        return np.zeros(len(seg_starts), dtype=np.intp), np.zeros(len(seg_starts), dtype=bool)
+    
+    if len(spk_starts) <= MAX_LOOP_SPEAKERS:
+        return match_speakers_loop(seg_starts, seg_ends, spk_starts, spk_ends)
+    
+    if len(seg_starts) * len(spk_starts) > MAX_DENSE_OVERLAP_CELLS:
+        return match_speakers_sweep(seg_starts, seg_ends, spk_starts, spk_ends)
+    
+    overlap = np.clip(
+        np.minimum(seg_ends[:, None], spk_ends) - np.maximum(seg_starts[:, None], spk_starts), 0, None
+    )
+    return overlap.argmax(axis=1), overlap.max(axis=1) > 0
+
+@njit(cache=True, fastmath=True)
+def match_speakers_loop(seg_starts, seg_ends, spk_starts, spk_ends):
+    """Same as match_speakers, as a compiled double loop without temporaries"""
+    best = np.zeros(len(seg_starts), dtype=np.intp)
+    matched = np.zeros(len(seg_starts), dtype=np.bool_)
+    for i in range(len(seg_starts)):
+        max_overlap = 0.0
+        for j in range(len(spk_starts)):
+            overlap = min(seg_ends[i], spk_ends[j]) - max(seg_starts[i], spk_starts[j])
+            if overlap > max_overlap:
+                max_overlap = overlap
+                best[i] = j
+                matched[i] = True
+    return best, matched
+
+def match_speakers_sweep(seg_starts, seg_ends, spk_starts, spk_ends):
+    """Same as match_speakers, as an O((N+M) log M) sweep over sorted speaker segments"""
+    order = np.argsort(spk_starts, kind="stable")
+    starts, ends = spk_starts[order], spk_ends[order]
+    
+    # Speakers before lo end before the segment starts, speakers from hi start after it ends
+    reach = np.maximum.accumulate(ends)
+    lo = np.searchsorted(reach, seg_starts, side="right")
+    hi = np.searchsorted(starts, seg_ends, side="left")
+    counts = np.maximum(hi - lo, 0)
+    
+    # Flatten the candidate windows into (segment, speaker) pairs
+    seg_idx = np.repeat(np.arange(len(seg_starts)), counts)
+    spk_idx = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    overlap = np.minimum(seg_ends[seg_idx], ends[spk_idx]) - np.maximum(seg_starts[seg_idx], starts[spk_idx])
+    
+    # Per segment keep the largest overlap, ties going to the earliest speaker segment
+    ranked = np.lexsort((order[spk_idx], -overlap, seg_idx))
+    _, first = np.unique(seg_idx[ranked], return_index=True)
+    chosen = ranked[first]
+    
+    best = np.zeros(len(seg_starts), dtype=np.intp)
+    best_overlap = np.zeros(len(seg_starts))
+    best[seg_idx[chosen]] = order[spk_idx[chosen]]
+    best_overlap[seg_idx[chosen]] = overlap[chosen]
+    return best, best_overlap > 0
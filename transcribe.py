@@ -1,14 +1,15 @@
 """
 Requirements:
-pip install whisper torch pyannote.audio spacy
+pip install whisper torch numpy numba pyannote.audio spacy
 """
 
 import whisper
 from pyannote.audio import Pipeline
 import torch
+import numpy as np
+from segment_utils import format_timestamps, match_speakers
 import json
 import spacy
-from datetime import datetime, timedelta
 
 class AudioProcessor:
     def __init__(self, auth_token):
@@ -16,18 +17,23 @@ class AudioProcessor:
         Initialize the AudioProcessor with HuggingFace auth token.
         Get your token from: https://hf.co/settings/tokens
         """
-        self.whisper_model = whisper.load_model("base")
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.whisper_model = whisper.load_model("base", device=self.device)
         self.diarization_pipeline = Pipeline.from_pretrained(
             "pyannote/speaker-diarization",
             use_auth_token=auth_token
-        ).to(torch.device("cuda" if torch.cuda.is_available() else "cpu"))
-        # Load spaCy for name recognition
-        self.nlp = spacy.load("en_core_web_sm")
+        ).to(self.device)
+        # Load spaCy for name recognition, only the NER component is needed
+        self.nlp = spacy.load(
+            "en_core_web_sm",
+            disable=["parser", "tagger", "lemmatizer", "attribute_ruler"]
+        )
 
-    def extract_names_from_text(self, text):
-        """Extract potential names from text using spaCy"""
-        doc = self.nlp(text)
-        names = [ent.text for ent in doc.ents if ent.label_ == "PERSON"]
+    def extract_names_from_text(self, texts):
+        """Extract potential names from a list of texts using spaCy"""
+        names = []
+        for doc in self.nlp.pipe(texts, batch_size=64):
+            names.extend(ent.text for ent in doc.ents if ent.label_ == "PERSON")
         return names
 
     def find_speaker_introductions(self, transcription, speaker_segments, intro_duration=30):
@@ -46,14 +52,11 @@ class AudioProcessor:
         # Join all introduction text
         intro_text = " ".join(intro_texts)
         
-        # Look for patterns like "I'm [Name]" or "My name is [Name]"
-        doc = self.nlp(intro_text.lower())
-        
         # Find speaker segments in intro period
         intro_speakers = [s for s in speaker_segments if s["start"] <= intro_duration]
         
         # Extract names from the introduction text
-        names = self.extract_names_from_text(intro_text)
+        names = self.extract_names_from_text([intro_text])
         
         # Map speakers to names based on order of appearance
         for i, speaker in enumerate(set(s["speaker"] for s in intro_speakers)):
@@ -62,16 +65,25 @@ class AudioProcessor:
         
         return speaker_names
 
-    def transcribe_audio(self, audio_path):
-        """Transcribe audio file using Whisper"""
+    def load_audio(self, audio_path):
+        """Decode audio file once as 16 kHz mono, shared by Whisper and pyannote"""
+        print("Loading audio...")
+        return torch.from_numpy(whisper.load_audio(audio_path))
+
+    def transcribe_audio(self, audio):
+        """Transcribe audio waveform using Whisper"""
         print("Transcribing audio...")
-        result = self.whisper_model.transcribe(audio_path)
+        # With the audio on the model's device the log-mel STFT is computed there, once
+        result = self.whisper_model.transcribe(audio.to(self.device))
         return result["segments"]
 
-    def get_speaker_segments(self, audio_path):
+    def get_speaker_segments(self, audio):
         """Get speaker diarization segments"""
         print("Analyzing speakers...")
-        diarization = self.diarization_pipeline(audio_path)
+        diarization = self.diarization_pipeline({
+            "waveform": audio.unsqueeze(0),
+            "sample_rate": whisper.audio.SAMPLE_RATE
+        })
         
         speaker_segments = []
         for turn, _, speaker in diarization.itertracks(yield_label=True):
@@ -84,25 +96,25 @@ class AudioProcessor:
 
     def match_transcription_with_speakers(self, transcription, speaker_segments, speaker_names=None):
         """Match transcribed segments with speaker information"""
+        seg_starts = np.array([s["start"] for s in transcription], dtype=np.float64)
+        seg_ends = np.array([s["end"] for s in transcription], dtype=np.float64)
+        best, matched = match_speakers(
+            seg_starts,
+            seg_ends,
+            np.array([s["start"] for s in speaker_segments], dtype=np.float64),
+            np.array([s["end"] for s in speaker_segments], dtype=np.float64)
+        )
+        
+        timestamps = format_timestamps(seg_starts, seg_ends)
+        
         final_segments = []
         
-        for trans_segment in transcription:
+        for trans_segment, timestamp, speaker_index, has_speaker in zip(
+            transcription, timestamps, best.tolist(), matched.tolist()
+        ):
             segment_start = trans_segment["start"]
             segment_end = trans_segment["end"]
-            
-            # Find overlapping speaker segment
-            current_speaker = None
-            max_overlap = 0
-            
-            for speaker_seg in speaker_segments:
-                overlap_start = max(segment_start, speaker_seg["start"])
-                overlap_end = min(segment_end, speaker_seg["end"])
-                
-                if overlap_end > overlap_start:
-                    overlap_duration = overlap_end - overlap_start
-                    if overlap_duration > max_overlap:
-                        max_overlap = overlap_duration
-                        current_speaker = speaker_seg["speaker"]
+            current_speaker = speaker_segments[speaker_index]["speaker"] if has_speaker else None
             
             # Use real name if available, otherwise use speaker ID
             if speaker_names and current_speaker in speaker_names:
@@ -115,7 +127,7 @@ class AudioProcessor:
                 "start": segment_start,
                 "end": segment_end,
                 "text": trans_segment["text"].strip(),
-                "timestamp": f"{timedelta(seconds=int(segment_start))} --> {timedelta(seconds=int(segment_end))}"
+                "timestamp": timestamp
             })
         
         return final_segments
@@ -123,8 +135,9 @@ class AudioProcessor:
     def process_audio(self, audio_path, output_path):
         """Process audio file and save results"""
         # Get transcription and speaker segments
-        transcription = self.transcribe_audio(audio_path)
-        speaker_segments = self.get_speaker_segments(audio_path)
+        audio = self.load_audio(audio_path)
+        transcription = self.transcribe_audio(audio)
+        speaker_segments = self.get_speaker_segments(audio)
         
         # Find speaker names from introductions
         speaker_names = self.find_speaker_introductions(transcription, speaker_segments)
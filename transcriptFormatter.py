@@ -1,15 +1,38 @@
-import json
+import orjson
 import time
 import os
 from datetime import datetime
+from itertools import groupby
+from pathlib import Path
+from threading import Lock
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import glob
 
+# Hidden, so the "*.json" glob and the watcher leave it alone
+STATE_FILENAME = ".transcript_state.json"
+
 class TranscriptFormatter:
     def __init__(self, directory):
         self.directory = directory
-        self.processed_files = {}  # Keep track of last modified times
+        self.state_path = os.path.join(directory, STATE_FILENAME)
+        self.processed_files = self.load_state()  # Keep track of last modified times, across restarts
+    
+    def load_state(self):
+        """Load last modified times of already formatted files"""
+        try:
+            with open(self.state_path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            return {}
+    
+    def mark_processed(self, json_path, modified_time):
+        """Record a formatted file and atomically rewrite the state file"""
+        self.processed_files[json_path] = modified_time
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(orjson.dumps(self.processed_files))
+        os.replace(tmp_path, self.state_path)
     
     def get_txt_path(self, json_path):
         """Convert JSON path to corresponding TXT path"""
@@ -17,41 +40,36 @@ class TranscriptFormatter:
         return f"{base_name}.txt"
     
     def format_transcript(self, json_path):
-        """Read JSON and format it into readable text"""
+        """Read JSON and format it into readable text, returns True on success"""
         try:
             # Read JSON file
-            with open(json_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            with open(json_path, 'rb') as f:
+                data = orjson.loads(f.read())
             
             txt_path = self.get_txt_path(json_path)
             
-            # Format the transcript
-            formatted_lines = []
-            current_speaker = None
-            
             # Add header with timestamp and filename
-            formatted_lines.append(f"Transcript: {os.path.basename(json_path)}")
-            formatted_lines.append(f"Generated at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            formatted_lines.append("=" * 80 + "\n")
+            header = [
+                f"Transcript: {os.path.basename(json_path)}",
+                f"Generated at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+                "=" * 80 + "\n"
+            ]
             
-            for segment in data:
-                # Add speaker line only when speaker changes
-                if segment["speaker"] != current_speaker:
-                    formatted_lines.append(f"\n[{segment['speaker']}]")
-                    current_speaker = segment["speaker"]
-                
-                # Add timestamp and text
-                formatted_lines.append(f"{segment['timestamp']}")
-                formatted_lines.append(f"{segment['text']}\n")
+            # One block per run of consecutive segments from the same speaker
+            blocks = (
+                f"\n[{speaker}]\n" + "\n".join(f"{s['timestamp']}\n{s['text']}\n" for s in segments)
+                for speaker, segments in groupby(data, key=lambda s: s["speaker"])
+            )
             
             # Write to text file
-            with open(txt_path, 'w', encoding='utf-8') as f:
-                f.write('\n'.join(formatted_lines))
+            Path(txt_path).write_text("\n".join([*header, *blocks]), encoding="utf-8")
             
             print(f"Updated transcript: {os.path.basename(txt_path)} at {datetime.now().strftime('%H:%M:%S')}")
+            return True
             
         except Exception as e:
             print(f"Error formatting transcript {json_path}: {str(e)}")
+            return False
 
     def process_directory(self):
         """Process all JSON files in directory"""
@@ -62,33 +80,61 @@ class TranscriptFormatter:
                 modified_time = os.path.getmtime(json_path)
                 last_processed = self.processed_files.get(json_path, 0)
                 
+                # Skip files whose transcript is already newer than the JSON
+                txt_path = self.get_txt_path(json_path)
+                if os.path.exists(txt_path) and os.path.getmtime(txt_path) >= modified_time:
+                    continue
+                
                 # Process file if it's new or modified
                 if modified_time > last_processed:
                     print(f"Processing {os.path.basename(json_path)}...")
-                    self.format_transcript(json_path)
-                    self.processed_files[json_path] = modified_time
+                    if self.format_transcript(json_path):
+                        self.mark_processed(json_path, modified_time)
             except Exception as e:
                 print(f"Error processing {json_path}: {str(e)}")
 
 class TranscriptWatcher(FileSystemEventHandler):
-    def __init__(self, formatter):
+    def __init__(self, formatter, settle_time=0.5):
         self.formatter = formatter
+        self.settle_time = settle_time  # Seconds a file must stay unmodified before formatting
+        self.dirty = set()
+        self.lock = Lock()
+    
+    def mark_dirty(self, event):
+        """Queue a changed JSON file, formatting happens in drain()"""
+        name = os.path.basename(event.src_path)
+        if not event.is_directory and name.lower().endswith('.json') and not name.startswith('.'):
+            with self.lock:
+                self.dirty.add(event.src_path)
     
     def on_created(self, event):
-        if not event.is_directory and event.src_path.lower().endswith('.json'):
-            # Add a small delay to ensure file is completely written
-            time.sleep(0.5)
-            print(f"\nNew JSON file detected: {os.path.basename(event.src_path)}")
-            self.formatter.format_transcript(event.src_path)
-            self.formatter.processed_files[event.src_path] = os.path.getmtime(event.src_path)
+        self.mark_dirty(event)
     
     def on_modified(self, event):
-        if not event.is_directory and event.src_path.lower().endswith('.json'):
-            # Add a small delay to ensure file is completely written
-            time.sleep(0.5)
-            print(f"\nJSON file modified: {os.path.basename(event.src_path)}")
-            self.formatter.format_transcript(event.src_path)
-            self.formatter.processed_files[event.src_path] = os.path.getmtime(event.src_path)
+        self.mark_dirty(event)
+    
+    def drain(self):
+        """Format each dirty file once, after it has stopped changing"""
+        with self.lock:
+            batch, self.dirty = self.dirty, set()
+        
+        now = time.time()
+        for json_path in batch:
+            try:
+                modified_time = os.path.getmtime(json_path)
+            except OSError:
+                continue  # Removed before we got to it
+            
+            if now - modified_time < self.settle_time:
+                # Still being written, check again on the next pass
+                with self.lock:
+                    self.dirty.add(json_path)
+                continue
+            
+            if modified_time > self.formatter.processed_files.get(json_path, 0):
+                print(f"\nJSON file changed: {os.path.basename(json_path)}")
+                if self.formatter.format_transcript(json_path):
+                    self.formatter.mark_processed(json_path, modified_time)
 
 def main():
     # Directory to watch (current directory by default)
@@ -112,9 +158,9 @@ def main():
     
     try:
         while True:
-            # Periodically check for new files that might have been missed
-            formatter.process_directory()
-            time.sleep(5)
+            # Format files the watcher has seen change
+            event_handler.drain()
+            time.sleep(event_handler.settle_time)
     except KeyboardInterrupt:
         observer.stop()
         print("\nStopped watching directory")